@@ -0,0 +1,78 @@
+"""
+Numeric kernels for the advanced pipeline's hot loops.
+Uses Numba-compiled versions when numba is installed, pure NumPy otherwise.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Cubic Bernstein basis at the t values sampled by the curve straightness test, shape (3, 4)
+BERN = np.array([[(1-t)**3, 3*(1-t)**2*t, 3*(1-t)*t*t, t**3] for t in (0.25, 0.5, 0.75)])
+
+
+def filter_components(labels: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    """Return a uint8 image that is 255 where ``keep[labels]`` is true and 0 elsewhere."""
+    if NUMBA_AVAILABLE:
+        out = np.empty(labels.shape, dtype=np.uint8)
+        _filter_components_numba(labels, keep, out)
+        return out
+    return keep[labels].astype(np.uint8) * 255
+
+
+def bezier_straight_mask(ctrl: np.ndarray, threshold: float) -> np.ndarray:
+    """Return a bool mask of the cubic curves in ``ctrl`` (shape (N, 4, 2)) that are nearly straight.
+
+    A curve is straight when its samples at t = 0.25, 0.5, 0.75 all lie within
+    ``threshold`` of the start-end chord, or when the chord is degenerate.
+    """
+    if NUMBA_AVAILABLE:
+        out = np.empty(len(ctrl), dtype=np.bool_)
+        _bezier_straight_mask_numba(ctrl, threshold, out)
+        return out
+
+    start = ctrl[:, 0]
+    chord = ctrl[:, 3] - start
+
+    # Sample all curves with the cached basis: (3, 4) @ (N, 4, 2) -> (N, 3, 2)
+    offset = BERN @ ctrl - start[:, None, :]
+
+    # Signed area of each sample against the start-end chord; comparing
+    # cross^2 < threshold^2 * |chord|^2 avoids the sqrt and the division
+    cross = offset[..., 0] * chord[:, None, 1] - offset[..., 1] * chord[:, None, 0]
+    length_sq = chord[:, 0] * chord[:, 0] + chord[:, 1] * chord[:, 1]
+    is_straight = np.all(cross * cross < (threshold * threshold) * length_sq[:, None], axis=1)
+    is_straight |= length_sq <= 1e-12
+    return is_straight
+
+
+if NUMBA_AVAILABLE:
+    # Serial on purpose: the batch drivers already run one image per process on every
+    # core, and a Numba thread pool in each worker would oversubscribe the machine
+    @njit(cache=True)
+    def _filter_components_numba(labels, keep, out):
+        for row in range(labels.shape[0]):
+            for col in range(labels.shape[1]):
+                out[row, col] = 255 if keep[labels[row, col]] else 0
+
+    @njit(cache=True, fastmath=True)
+    def _bezier_straight_mask_numba(ctrl, threshold, out):
+        threshold_sq = threshold * threshold
+        for i in range(ctrl.shape[0]):
+            sx, sy = ctrl[i, 0, 0], ctrl[i, 0, 1]
+            dx, dy = ctrl[i, 3, 0] - sx, ctrl[i, 3, 1] - sy
+            length_sq = dx * dx + dy * dy
+            straight = True
+            if length_sq > 1e-12:
+                for k in range(3):
+                    px = BERN[k, 0] * ctrl[i, 0, 0] + BERN[k, 1] * ctrl[i, 1, 0] + BERN[k, 2] * ctrl[i, 2, 0] + BERN[k, 3] * ctrl[i, 3, 0]
+                    py = BERN[k, 0] * ctrl[i, 0, 1] + BERN[k, 1] * ctrl[i, 1, 1] + BERN[k, 2] * ctrl[i, 2, 1] + BERN[k, 3] * ctrl[i, 3, 1]
+                    cross = (px - sx) * dy - (py - sy) * dx
+                    if cross * cross >= threshold_sq * length_sq:
+                        straight = False
+                        break
+            out[i] = straight
@@ -3,11 +3,22 @@ Advanced PNG to SVG conversion pipeline optimized for AI-generated images.
 Uses advanced preprocessing, adaptive thresholding, and optimized path processing.
 """
 
+import multiprocessing.util
 import os
+import re
+import shutil
 import time
+import xml.etree.ElementTree as ET
 import numpy as np
 from typing import List, Tuple
 from loguru import logger
+from PIL import Image, ImageEnhance
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
 
 try:
     from svgpathtools import svg2paths, Path, Line, Arc, CubicBezier, QuadraticBezier
@@ -16,6 +27,17 @@ try:
 except ImportError:
     SVGPATHTOOLS_AVAILABLE = False
 
+try:
+    # pypotrace binding: traces in-process instead of forking the potrace CLI. Only the
+    # compiled binding qualifies; potracer installs a pure-Python `potrace` package of
+    # the same name that is far slower than the CLI
+    import potrace as potracelib
+    from potrace import _potrace
+    from importlib.machinery import EXTENSION_SUFFIXES
+    POTRACELIB_AVAILABLE = (getattr(_potrace, '__file__', None) or '').endswith(tuple(EXTENSION_SUFFIXES))
+except ImportError:
+    POTRACELIB_AVAILABLE = False
+
 try:
     from ai_image_tuning import PREPROCESSING, POTRACE, VPYPE, SVG_PROCESSING
     TUNING_AVAILABLE = True
@@ -23,6 +45,7 @@ except ImportError:
     TUNING_AVAILABLE = False
     # Default parameters if tuning file not available
     PREPROCESSING = {
+        'denoise': 'median',  # 'median' or 'bilateral' (uses the bilateral_* settings below)
         'bilateral_d': 9,
         'bilateral_sigmaColor': 75,
         'bilateral_sigmaSpace': 75,
@@ -50,6 +73,7 @@ except ImportError:
 try:
     from .optimized_pipeline import OptimizedPipeline
     from .base_pipeline import ConversionResult
+    from ._kernels import filter_components, bezier_straight_mask
 except ImportError:
     # Handle direct execution
     import sys
@@ -57,6 +81,27 @@ except ImportError:
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from optimized_pipeline import OptimizedPipeline
     from base_pipeline import ConversionResult
+    from _kernels import filter_components, bezier_straight_mask
+
+# Command-line templates built once from the tuning parameters
+_POTRACE_BASE = [
+    "potrace",
+    "--turdsize", str(POTRACE['turdsize']),
+    "--alphamax", str(POTRACE['alphamax']),
+    "--opttolerance", str(POTRACE['opttolerance']),
+] + (["--longcurve"] if POTRACE['longcurve'] else []) + ["--svg"]
+_VPYPE_STEPS = [
+    "linemerge", "--tolerance", str(VPYPE['linemerge_tolerance']),
+    "linesimplify", "--tolerance", str(VPYPE['linesimplify_tolerance']),
+    "reloop", "--tolerance", str(VPYPE['reloop_tolerance']),
+]
+
+# Integer segment tags; paths are processed as a tag array plus an (N, 4, 2) control-point array
+_SEG_LINE, _SEG_CUBIC, _SEG_QUAD = 0, 1, 2
+
+# Tokens of an SVG path ``d`` attribute: single-letter commands and numbers
+_PATH_TOKEN_RE = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_PATH_ARG_COUNTS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'Q': 4}
 
 
 class AdvancedPipeline(OptimizedPipeline):
@@ -65,6 +110,11 @@ class AdvancedPipeline(OptimizedPipeline):
     def __init__(self, config: dict):
         super().__init__(config)
         self.name = "advanced"
+        self.debug = config.get('debug', False)
+        self.debug_dir = "debug_preprocessing"
+        
+        # CLAHE state is reused across every image this instance converts
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8)) if CV2_AVAILABLE else None
     
     def get_required_tools(self) -> List[str]:
         """Return list of required command-line tools."""
@@ -82,10 +132,6 @@ class AdvancedPipeline(OptimizedPipeline):
         result = ConversionResult(input_path, output_path)
         start_time = time.time()
         
-        # Create debug directory
-        debug_dir = "debug_preprocessing"
-        os.makedirs(debug_dir, exist_ok=True)
-        
         try:
             # Validate input
             if not self.validate_input(input_path):
@@ -97,44 +143,40 @@ class AdvancedPipeline(OptimizedPipeline):
                 result.error_message = "Required dependencies not available"
                 return result
             
-            # Stage 1: Advanced preprocessing
+            # Debug copies of each stage are only written when debug is enabled
+            if self.debug:
+                os.makedirs(self.debug_dir, exist_ok=True)
+            
+            # Stage 1: Advanced preprocessing (saves 10_preprocessed_final.png itself in debug mode)
             preprocessed_png = self.get_temp_path("preprocessed.png")
             if not self._preprocess_image(input_path, preprocessed_png, result):
                 return result
             
-            # Copy preprocessed image to debug directory
-            import shutil
-            shutil.copy(preprocessed_png, f"{debug_dir}/10_preprocessed_final.png")
-            
             # Stage 2: PNG to SVG using optimized potrace
             intermediate_svg = self.get_temp_path("traced.svg")
             if not self._png_to_svg_potrace(preprocessed_png, intermediate_svg, result):
                 return result
             
-            # Copy traced SVG to debug directory
-            shutil.copy(intermediate_svg, f"{debug_dir}/11_potrace_traced.svg")
+            if self.debug:
+                shutil.copy(intermediate_svg, f"{self.debug_dir}/11_potrace_traced.svg")
             
             # Stage 3: SVG cleanup using vpype
             cleaned_svg = self.get_temp_path("cleaned.svg")
             if not self._svg_cleanup_vpype(intermediate_svg, cleaned_svg, result):
                 return result
             
-            # Copy cleaned SVG to debug directory
-            shutil.copy(cleaned_svg, f"{debug_dir}/12_cleaned.svg")
+            if self.debug:
+                shutil.copy(cleaned_svg, f"{self.debug_dir}/12_cleaned.svg")
             
-            # Stage 4: Advanced path processing
-            processed_svg = self.get_temp_path("processed.svg")
-            if not self._svg_processing_svgpathtools(cleaned_svg, processed_svg, result):
+            # Stage 4: Advanced path processing at the original resolution, written straight to the final output
+            scale = result.metrics.get("preprocess_scale", 1.0)
+            if not self._svg_processing_svgpathtools(cleaned_svg, output_path, result, scale=scale):
                 return result
             
-            # Copy processed SVG to debug directory
-            shutil.copy(processed_svg, f"{debug_dir}/13_processed.svg")
-            
-            # Final output is the processed SVG
-            shutil.copy(processed_svg, output_path)
-            
-            print(f"DEBUG: Complete pipeline saved to {debug_dir}/ directory")
-            print(f"DEBUG: Check files 10-13 for pipeline stages")
+            if self.debug:
+                shutil.copy(output_path, f"{self.debug_dir}/13_processed.svg")
+                print(f"DEBUG: Complete pipeline saved to {self.debug_dir}/ directory")
+                print(f"DEBUG: Check files 10-13 for pipeline stages")
             
             result.success = True
             
@@ -155,11 +197,18 @@ class AdvancedPipeline(OptimizedPipeline):
     def _preprocess_image(self, input_path: str, output_path: str, result: ConversionResult) -> bool:
         """Advanced preprocessing for AI-generated images with noise removal."""
         try:
-            from PIL import Image
-            
             # Read image
             img = Image.open(input_path)
             
+            # Downscale oversized inputs; preprocessing cost grows with pixel count
+            # and the traced paths are scaled back up in stage 4
+            max_dim = self.config.get('max_preprocess_dim', 1500)
+            if max_dim and max(img.size) > max_dim:
+                original_width = img.size[0]
+                img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+                result.add_metric("preprocess_scale", original_width / img.size[0])
+                logger.info(f"Downscaled input for preprocessing to {img.size[0]}x{img.size[1]}")
+            
             # Apply advanced preprocessing with noise removal
             processed_img = self._preprocess_image_advanced(img, result)
             
@@ -176,55 +225,58 @@ class AdvancedPipeline(OptimizedPipeline):
     
     def _preprocess_image_advanced(self, img, result: ConversionResult):
         """Advanced preprocessing optimized for AI-generated images with debug output."""
+        if not CV2_AVAILABLE:
+            logger.warning("OpenCV not available, using simple preprocessing")
+            return self._preprocess_image_simple(img, result)
+        
         try:
-            import cv2
-            import numpy as np
-            from PIL import Image, ImageEnhance
-            
-            # Create debug directory
-            debug_dir = "debug_preprocessing"
-            os.makedirs(debug_dir, exist_ok=True)
-            
             # Convert to grayscale and save
             if img.mode != 'L':
                 img = img.convert('L')
-            img.save(f"{debug_dir}/01_original_grayscale.png")
+            self._save_debug_image(img, "01_original_grayscale.png")
             
             # Convert PIL to OpenCV format
             img_array = np.array(img)
             
+            # Steps 1-2 share a single scratch buffer instead of allocating a new image per step
+            scratch = np.empty_like(img_array)
+            
             # Step 1: Noise reduction (preserve edges)
-            blurred = cv2.medianBlur(img_array, 3)
-            Image.fromarray(blurred).save(f"{debug_dir}/02_median_blur.png")
+            if PREPROCESSING.get('denoise', 'median') == 'bilateral':
+                cv2.bilateralFilter(img_array, PREPROCESSING['bilateral_d'], PREPROCESSING['bilateral_sigmaColor'],
+                                    PREPROCESSING['bilateral_sigmaSpace'], dst=scratch)
+            else:
+                cv2.medianBlur(img_array, 3, dst=scratch)
+            self._save_debug_image(scratch, "02_median_blur.png")
             
-            # Step 2: Morphological opening to remove noise
+            # Step 2: Morphological opening to remove noise (in place)
             kernel = np.ones((2,2), np.uint8)
-            opened = cv2.morphologyEx(blurred, cv2.MORPH_OPEN, kernel, iterations=1)
-            Image.fromarray(opened).save(f"{debug_dir}/03_morphology_open.png")
+            cv2.morphologyEx(scratch, cv2.MORPH_OPEN, kernel, dst=scratch, iterations=1)
+            self._save_debug_image(scratch, "03_morphology_open.png")
             
             # Step 3: CLAHE for local contrast enhancement
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            contrast_enhanced = clahe.apply(opened)
-            Image.fromarray(contrast_enhanced).save(f"{debug_dir}/04_clahe_contrast.png")
-            
-            # Step 4: Dual thresholding approach
-            # Adaptive threshold
-            adaptive_thresh = cv2.adaptiveThreshold(
-                contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 
-                blockSize=15, C=1
-            )
-            Image.fromarray(adaptive_thresh).save(f"{debug_dir}/05a_adaptive_threshold.png")
+            contrast_enhanced = self._clahe.apply(scratch)
+            self._save_debug_image(contrast_enhanced, "04_clahe_contrast.png")
+            
+            # Step 4: Thresholding
+            # Adaptive threshold is only computed as a debug diagnostic since Otsu is always chosen
+            if self.debug:
+                adaptive_thresh = cv2.adaptiveThreshold(
+                    contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 
+                    blockSize=15, C=1
+                )
+                self._save_debug_image(adaptive_thresh, "05a_adaptive_threshold.png")
             
             # Otsu threshold  
             _, otsu_thresh = cv2.threshold(contrast_enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            Image.fromarray(otsu_thresh).save(f"{debug_dir}/05b_otsu_threshold.png")
+            self._save_debug_image(otsu_thresh, "05b_otsu_threshold.png")
             
             # Choose the better threshold (you can modify this logic)
             # For now, let's use Otsu since the user said it looks better
             chosen_thresh = otsu_thresh
             threshold_method = "otsu"
             
-            Image.fromarray(chosen_thresh).save(f"{debug_dir}/06_chosen_threshold_{threshold_method}.png")
+            self._save_debug_image(chosen_thresh, f"06_chosen_threshold_{threshold_method}.png")
             
             # **NEW**: Add option to skip post-processing when threshold looks good
             skip_post_processing = getattr(self, 'skip_post_processing', False)
@@ -232,8 +284,9 @@ class AdvancedPipeline(OptimizedPipeline):
             if skip_post_processing:
                 print("DEBUG: Skipping post-processing - using clean threshold result")
                 processed_img = Image.fromarray(chosen_thresh)
-                processed_img.save(f"{debug_dir}/10_preprocessed_final.png")
-                print(f"DEBUG: Preprocessing complete (threshold-only). Check {debug_dir}/ for results.")
+                self._save_debug_image(processed_img, "10_preprocessed_final.png")
+                if self.debug:
+                    print(f"DEBUG: Preprocessing complete (threshold-only). Check {self.debug_dir}/ for results.")
                 return processed_img
             
             # Continue with original post-processing (steps 07-10)
@@ -256,22 +309,20 @@ class AdvancedPipeline(OptimizedPipeline):
             
             print(f"DEBUG: Image complexity: {complexity}, min_area threshold: {min_area}")
             
-            # Create clean binary image
-            clean_img = np.zeros_like(img_array)
-            kept_components = 0
-            for i in range(1, num_labels):  # Skip background (label 0)
-                if stats[i, cv2.CC_STAT_AREA] >= min_area:
-                    clean_img[labels == i] = 255
-                    kept_components += 1
+            # Create clean binary image with one lookup over the label map
+            keep = stats[:, cv2.CC_STAT_AREA] >= min_area
+            keep[0] = False  # Skip background (label 0)
+            clean_img = filter_components(labels, keep)
+            kept_components = int(keep.sum())
             
             print(f"DEBUG: Kept {kept_components} components out of {num_labels-1}")
-            Image.fromarray(clean_img).save(f"{debug_dir}/07_component_filtered.png")
+            self._save_debug_image(clean_img, "07_component_filtered.png")
             
             # Step 5: Gentle final cleanup (preserve detail)
             # Use smaller kernel for final morphology
             kernel_final = np.ones((1,1), np.uint8)  # Minimal final cleanup
             clean_img = cv2.morphologyEx(clean_img, cv2.MORPH_CLOSE, kernel_final, iterations=1)
-            Image.fromarray(clean_img).save(f"{debug_dir}/08_final_morphology.png")
+            self._save_debug_image(clean_img, "08_final_morphology.png")
             
             # Convert back to PIL Image
             processed_img = Image.fromarray(clean_img)
@@ -279,10 +330,11 @@ class AdvancedPipeline(OptimizedPipeline):
             # Moderate contrast boost (preserve detail)
             enhancer = ImageEnhance.Contrast(processed_img)
             processed_img = enhancer.enhance(1.5)  # Reduced from 2.0
-            processed_img.save(f"{debug_dir}/09_final_contrast.png")
+            self._save_debug_image(processed_img, "09_final_contrast.png")
             
-            processed_img.save(f"{debug_dir}/10_preprocessed_final.png")
-            print(f"DEBUG: Preprocessing complete. Check {debug_dir}/ for intermediate results.")
+            self._save_debug_image(processed_img, "10_preprocessed_final.png")
+            if self.debug:
+                print(f"DEBUG: Preprocessing complete. Check {self.debug_dir}/ for intermediate results.")
             
             # result.add_step("Advanced preprocessing with intelligent detail preservation")
             return processed_img
@@ -292,11 +344,20 @@ class AdvancedPipeline(OptimizedPipeline):
             # Fallback to simple processing
             return self._preprocess_image_simple(img, result)
     
+    def _save_debug_image(self, image, filename: str):
+        """Save an intermediate preprocessing image when debug output is enabled."""
+        if not self.debug:
+            return
+        
+        # Write arrays directly with libpng at a low DEFLATE level instead of re-encoding through PIL
+        if not isinstance(image, np.ndarray):
+            image = np.asarray(image)
+        os.makedirs(self.debug_dir, exist_ok=True)
+        cv2.imwrite(f"{self.debug_dir}/{filename}", image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    
     def _preprocess_image_simple(self, img, result: ConversionResult):
         """Simple fallback preprocessing."""
         try:
-            from PIL import ImageEnhance
-            
             # Convert to grayscale if needed
             if img.mode != 'L':
                 img = img.convert('L')
@@ -316,33 +377,32 @@ class AdvancedPipeline(OptimizedPipeline):
         """Convert PNG to SVG using potrace with optimized parameters for AI images."""
         logger.info(f"Converting PNG to SVG using potrace: {png_path} -> {svg_path}")
         
-        # First convert PNG to PBM format
-        pbm_path = self.get_temp_path("input.pbm")
-        if not self._png_to_pbm(png_path, pbm_path, result):
+        # Fall through to the CLI if the in-process trace fails for any reason
+        if POTRACELIB_AVAILABLE and self._png_to_svg_potracelib(png_path, svg_path, result):
+            return True
+        return self._png_to_svg_potrace_cli(png_path, svg_path, result)
+    
+    def _png_to_svg_potrace_cli(self, png_path: str, svg_path: str, result: ConversionResult) -> bool:
+        """Trace PNG with the potrace CLI, piping the PBM through stdin/stdout."""
+        # Encode PNG as PBM in memory; potrace reads it from stdin and writes SVG to stdout
+        try:
+            pbm_bytes = self._png_to_pbm_bytes(png_path)
+        except Exception as e:
+            result.error_message = f"PNG to PBM conversion failed: {str(e)}"
+            logger.error(f"PNG to PBM conversion failed: {str(e)}")
             return False
         
-        # Build potrace command with optimized parameters for AI images
-        command = [
-            "potrace",
-            "--turdsize", str(POTRACE['turdsize']),
-            "--alphamax", str(POTRACE['alphamax']),
-            "--opttolerance", str(POTRACE['opttolerance']),
-            "--svg",                 # Output format
-            "--output", svg_path,    # Output file
-            pbm_path                 # Input file
-        ]
-        
-        # Add longcurve option if enabled
-        if POTRACE['longcurve']:
-            command.insert(-3, "--longcurve")
+        # Potrace command with optimized parameters for AI images
+        command = _POTRACE_BASE + ["--output", "-", "-"]
         
         # Run potrace
-        success, stdout, stderr = self.run_subprocess(command, "potrace PBM to SVG")
+        success, stdout, stderr = self.run_subprocess(command, "potrace PBM to SVG", input_data=pbm_bytes)
         
-        if success and os.path.exists(svg_path):
-            result.add_intermediate_file(pbm_path, "PNG to PBM conversion")
+        if success and stdout:
+            with open(svg_path, 'wb') as f:
+                f.write(stdout)
             result.add_intermediate_file(svg_path, "potrace SVG output")
-            result.add_metric("svg_file_size_bytes", self.get_file_size(svg_path))
+            result.add_metric("svg_file_size_bytes", len(stdout))
             logger.info("PNG to SVG conversion successful")
             return True
         else:
@@ -350,18 +410,109 @@ class AdvancedPipeline(OptimizedPipeline):
             logger.error(f"potrace failed: {stderr}")
             return False
     
+    def _png_to_svg_potracelib(self, png_path: str, svg_path: str, result: ConversionResult) -> bool:
+        """Trace PNG in-process with the pypotrace binding, skipping the PBM file and potrace subprocess."""
+        try:
+            # Dark pixels are foreground, matching the PBM conversion used for the CLI
+            img_array = np.asarray(Image.open(png_path).convert('L'))
+            bitmap = potracelib.Bitmap(img_array < 128)
+            path_set = bitmap.trace(
+                turdsize=POTRACE['turdsize'],
+                alphamax=POTRACE['alphamax'],
+                opticurve=not POTRACE['longcurve'],  # --longcurve turns off curve optimization
+                opttolerance=POTRACE['opttolerance'],
+            )
+            
+            height, width = img_array.shape
+            self._write_potrace_svg(path_set, width, height, svg_path)
+            
+            result.add_intermediate_file(svg_path, "potrace SVG output")
+            result.add_metric("svg_file_size_bytes", self.get_file_size(svg_path))
+            logger.info("PNG to SVG conversion successful (in-process potrace)")
+            return True
+            
+        except Exception as e:
+            logger.warning(f"In-process potrace failed, falling back to the potrace CLI: {e}")
+            return False
+    
+    def _write_potrace_svg(self, path_set, width: int, height: int, svg_path: str):
+        """Write traced potrace curves as an SVG in the CLI's frame, one <path> per outer curve and its holes."""
+        def fmt(point):
+            # pypotrace points are tuples/arrays; potracer's are objects with .x/.y
+            x, y = (point.x, point.y) if hasattr(point, 'x') else point
+            # Same units as the CLI: 10x integer coordinates with y pointing up, undone by the group transform
+            return f"{round(x * 10)} {round((height - y) * 10)}"
+        
+        def subpath(curve):
+            d = [f"M{fmt(curve.start_point)}"]
+            for segment in curve.segments:
+                if segment.is_corner:
+                    d.append(f" L{fmt(segment.c)} {fmt(segment.end_point)}")
+                else:
+                    d.append(f" C{fmt(segment.c1)} {fmt(segment.c2)} {fmt(segment.end_point)}")
+            d.append(" z")
+            return "".join(d)
+        
+        # Group each top-level curve with its direct children (holes); grandchildren are
+        # filled islands and start groups of their own. Without a curve tree, every curve
+        # goes into one path and the even-odd rule cuts the holes
+        curves_tree = getattr(path_set, 'curves_tree', None)
+        if curves_tree is None:
+            groups = [list(path_set)]
+        else:
+            groups = []
+            pending = list(curves_tree)
+            while pending:
+                curve = pending.pop(0)
+                children = list(curve.children or [])
+                groups.append([curve] + children)
+                for child in children:
+                    pending.extend(child.children or [])
+        
+        path_elements = [f'<path d="{" ".join(subpath(c) for c in group)}"/>' for group in groups if group]
+        
+        # Header and group transform match `potrace --svg`, so stage 4 (which ignores transforms)
+        # sees the same coordinates whichever tracer ran
+        svg_content = f'''<?xml version="1.0" standalone="no"?>
+<svg version="1.0" xmlns="http://www.w3.org/2000/svg"
+ width="{width:.6f}pt" height="{height:.6f}pt" viewBox="0 0 {width:.6f} {height:.6f}"
+ preserveAspectRatio="xMidYMid meet">
+<g transform="translate(0.000000,{height:.6f}) scale(0.100000,-0.100000)"
+fill="#000000" fill-rule="evenodd" stroke="none">
+{chr(10).join(path_elements)}
+</g>
+</svg>'''
+        with open(svg_path, 'w') as f:
+            f.write(svg_content)
+    
+    def check_potrace_frame(self, png_path: str) -> bool:
+        """Trace png_path with both the potrace CLI and pypotrace and check stage 4 reads the same path bounds."""
+        if not POTRACELIB_AVAILABLE or not shutil.which(_POTRACE_BASE[0]):
+            print("⚠️  Frame check needs both pypotrace and the potrace CLI, skipping")
+            return True
+        
+        bounds = {}
+        for name, trace in (("cli", self._png_to_svg_potrace_cli), ("pypotrace", self._png_to_svg_potracelib)):
+            svg_path = self.get_temp_path(f"frame_check_{name}.svg")
+            if not trace(png_path, svg_path, ConversionResult(png_path, svg_path)):
+                print(f"❌ {name} trace failed")
+                return False
+            points = np.concatenate([ctrl.reshape(-1, 2) for _, ctrl in self._read_svg_paths(svg_path)])
+            bounds[name] = np.concatenate([points.min(axis=0), points.max(axis=0)])
+            print(f"DEBUG: {name} stage-4 bounds (x0, y0, x1, y1): {bounds[name]}")
+        
+        # Both write 10x integer coordinates from the same libpotrace curves, so allow one rounding step
+        if np.allclose(bounds["cli"], bounds["pypotrace"], atol=1):
+            print("✅ CLI and pypotrace SVGs share the same frame")
+            return True
+        print("❌ CLI and pypotrace SVGs are in different frames")
+        return False
+    
     def _svg_cleanup_vpype(self, input_svg: str, output_svg: str, result: ConversionResult) -> bool:
         """Clean up SVG using vpype with optimized parameters, fallback to built-in cleanup."""
         try:
-            # Build vpype command with optimized parameters
-            command = [
-                "vpype",
-                "read", input_svg,
-                "linemerge", "--tolerance", str(VPYPE['linemerge_tolerance']),
-                "linesimplify", "--tolerance", str(VPYPE['linesimplify_tolerance']),
-                "reloop", "--tolerance", str(VPYPE['reloop_tolerance']),
-                "write", output_svg
-            ]
+            # vpype command with optimized parameters
+            command = ["vpype", "read", input_svg] + _VPYPE_STEPS + ["write", output_svg]
             
             # Run vpype
             success, stdout, stderr = self.run_subprocess(command, "vpype SVG cleanup")
@@ -379,30 +530,31 @@ class AdvancedPipeline(OptimizedPipeline):
             logger.info("Falling back to built-in SVG cleanup")
             return self._svg_cleanup_builtin(input_svg, output_svg, result)
     
-    def _svg_processing_svgpathtools(self, input_svg: str, output_svg: str, result: ConversionResult) -> bool:
-        """Advanced SVG processing using svgpathtools."""
+    def _svg_processing_svgpathtools(self, input_svg: str, output_svg: str, result: ConversionResult,
+                                     scale: float = 1.0) -> bool:
+        """Advanced SVG processing using svgpathtools, optionally scaling path coordinates."""
         try:
-            # Read paths from SVG
-            paths, attributes = svg2paths(input_svg)
+            # Read paths from SVG as (segment tags, control points) arrays
+            paths = self._read_svg_paths(input_svg, scale=scale)
             
             if not paths:
                 result.error_message = "No paths found in SVG file"
                 logger.error("No paths found in SVG file")
                 return False
             
-            # Process each path
+            # Process each path; all passes work on the arrays and a Path is built once at the end
             processed_paths = []
-            for path in paths:
+            for tags, ctrl in paths:
                 # Simplify curves
-                path = self._simplify_curves(path, threshold=SVG_PROCESSING['curve_simplify_threshold'])
+                self._simplify_curves(tags, ctrl, threshold=SVG_PROCESSING['curve_simplify_threshold'])
                 
                 # Merge collinear lines
-                path = self._merge_collinear_lines(path, tolerance=SVG_PROCESSING['collinear_tolerance'])
+                tags, ctrl = self._merge_collinear_lines(tags, ctrl, tolerance=SVG_PROCESSING['collinear_tolerance'])
                 
                 # Close nearly closed paths
-                path = self._close_nearly_closed_paths(path, tolerance=SVG_PROCESSING['close_path_tolerance'])
+                tags, ctrl = self._close_nearly_closed_paths(tags, ctrl, tolerance=SVG_PROCESSING['close_path_tolerance'])
                 
-                processed_paths.append(path)
+                processed_paths.append(self._build_path(tags, ctrl))
             
             # Write processed SVG
             wsvg(processed_paths, filename=output_svg)
@@ -415,95 +567,218 @@ class AdvancedPipeline(OptimizedPipeline):
             logger.error(f"SVG processing failed: {str(e)}")
             return False
     
-    def _simplify_curves(self, path: Path, threshold: float) -> Path:
-        """Simplify curves that are nearly straight lines."""
-        simplified_segments = []
+    def _read_svg_paths(self, svg_path: str, scale: float = 1.0) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Stream-parse an SVG into (segment tags, control points) pairs, multiplying coordinates by ``scale``.
         
-        for segment in path:
-            if isinstance(segment, (CubicBezier, QuadraticBezier)):
-                # Check if curve is nearly straight
-                start = segment.start
-                end = segment.end
-                
-                # Sample points along the curve
-                sample_points = [segment.point(t) for t in [0.25, 0.5, 0.75]]
-                
-                # Check if all sample points are close to the straight line
-                is_straight = all(
-                    abs((point - start).real * (end - start).imag - (point - start).imag * (end - start).real) / abs(end - start) < threshold
-                    for point in sample_points
-                ) if abs(end - start) > 1e-6 else True
-                
-                if is_straight:
-                    simplified_segments.append(Line(start, end))
-                else:
-                    simplified_segments.append(segment)
-            else:
-                simplified_segments.append(segment)
+        Handles the path commands potrace and vpype emit; anything else falls back to svg2paths.
+        """
+        parsed = []
+        try:
+            for _, elem in ET.iterparse(svg_path, events=('end',)):
+                name = elem.tag.rsplit('}', 1)[-1]
+                if name == 'path':
+                    parsed.append(self._parse_path_data(elem.get('d', '')))
+                elif name in ('polyline', 'polygon'):
+                    points = elem.get('points', '').replace(',', ' ').split()
+                    d = 'M' + ' '.join(points) + ('Z' if name == 'polygon' else '')
+                    parsed.append(self._parse_path_data(d))
+                elif name in ('line', 'rect', 'circle', 'ellipse'):
+                    raise ValueError(f"unsupported element <{name}>")
+                elem.clear()
+        except ValueError as e:
+            logger.debug(f"Falling back to svg2paths for {svg_path}: {e}")
+            paths, _ = svg2paths(svg_path)
+            parsed = [self._path_to_arrays(path) for path in paths]
         
-        return Path(*simplified_segments)
+        if scale != 1.0:
+            parsed = [(tags, ctrl * scale) for tags, ctrl in parsed]
+        return parsed
     
-    def _merge_collinear_lines(self, path: Path, tolerance: float) -> Path:
-        """Merge consecutive collinear lines."""
-        if len(path) < 2:
-            return path
+    def _parse_path_data(self, d: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Tokenize a path ``d`` string into segment tags and (N, 4, 2) control points.
         
-        merged_segments = []
-        current_segment = path[0]
+        Lines are stored as (start, start, end, end), quadratics as (start, ctrl, ctrl, end).
+        """
+        tokens = _PATH_TOKEN_RE.findall(d)
+        tags = []
+        ctrl = []
+        cx = cy = 0.0  # current point
+        sx = sy = 0.0  # start of current subpath
+        cmd = None
+        i = 0
+        while i < len(tokens):
+            if tokens[i].isalpha():
+                cmd = tokens[i]
+                i += 1
+                if cmd in 'Zz':
+                    if (cx, cy) != (sx, sy):
+                        tags.append(_SEG_LINE)
+                        ctrl.append(((cx, cy), (cx, cy), (sx, sy), (sx, sy)))
+                    cx, cy = sx, sy
+                    continue
+                if cmd.upper() not in _PATH_ARG_COUNTS:
+                    raise ValueError(f"unsupported path command {cmd!r}")
+            elif cmd is None or cmd in 'Zz':
+                raise ValueError("path data has coordinates without a command")
+            
+            op = cmd.upper()
+            count = _PATH_ARG_COUNTS[op]
+            args = [float(t) for t in tokens[i:i + count]]
+            if len(args) < count:
+                raise ValueError(f"truncated arguments for path command {cmd!r}")
+            i += count
+            
+            # Relative commands are offset from the current point
+            ox, oy = (cx, cy) if cmd.islower() else (0.0, 0.0)
+            if op == 'M':
+                cx, cy = ox + args[0], oy + args[1]
+                sx, sy = cx, cy
+                # Further coordinate pairs after a moveto are implicit linetos
+                cmd = 'l' if cmd.islower() else 'L'
+                continue
+            if op == 'C':
+                nx, ny = ox + args[4], oy + args[5]
+                tags.append(_SEG_CUBIC)
+                ctrl.append(((cx, cy), (ox + args[0], oy + args[1]), (ox + args[2], oy + args[3]), (nx, ny)))
+            elif op == 'Q':
+                nx, ny = ox + args[2], oy + args[3]
+                q = (ox + args[0], oy + args[1])
+                tags.append(_SEG_QUAD)
+                ctrl.append(((cx, cy), q, q, (nx, ny)))
+            else:
+                if op == 'L':
+                    nx, ny = ox + args[0], oy + args[1]
+                elif op == 'H':
+                    nx, ny = ox + args[0], cy
+                else:  # 'V'
+                    nx, ny = cx, oy + args[0]
+                tags.append(_SEG_LINE)
+                ctrl.append(((cx, cy), (cx, cy), (nx, ny), (nx, ny)))
+            cx, cy = nx, ny
         
-        for next_segment in path[1:]:
-            if isinstance(current_segment, Line) and isinstance(next_segment, Line):
-                if self._lines_are_collinear(current_segment, next_segment, tolerance):
-                    # Merge the lines
-                    current_segment = Line(current_segment.start, next_segment.end)
-                else:
-                    merged_segments.append(current_segment)
-                    current_segment = next_segment
+        return np.array(tags, dtype=np.int8), np.array(ctrl, dtype=np.float64).reshape(-1, 4, 2)
+    
+    def _build_path(self, tags: np.ndarray, ctrl: np.ndarray) -> Path:
+        """Build an svgpathtools Path from segment tags and control points."""
+        points = (ctrl[..., 0] + 1j * ctrl[..., 1]).tolist()
+        segments = []
+        for tag, (p0, c1, c2, p3) in zip(tags.tolist(), points):
+            if tag == _SEG_LINE:
+                segments.append(Line(p0, p3))
+            elif tag == _SEG_CUBIC:
+                segments.append(CubicBezier(p0, c1, c2, p3))
             else:
-                merged_segments.append(current_segment)
-                current_segment = next_segment
+                segments.append(QuadraticBezier(p0, c1, p3))
+        return Path(*segments)
+    
+    def _path_to_arrays(self, path: Path) -> Tuple[np.ndarray, np.ndarray]:
+        """Convert an svgpathtools Path to segment tags and control points (arcs become cubics)."""
+        tags = []
+        points = []
+        for segment in path:
+            if isinstance(segment, Arc):
+                for cubic in segment.as_cubic_curves():
+                    tags.append(_SEG_CUBIC)
+                    points.append(cubic.bpoints())
+            elif isinstance(segment, QuadraticBezier):
+                tags.append(_SEG_QUAD)
+                points.append((segment.start, segment.control, segment.control, segment.end))
+            elif isinstance(segment, CubicBezier):
+                tags.append(_SEG_CUBIC)
+                points.append(segment.bpoints())
+            else:
+                tags.append(_SEG_LINE)
+                points.append((segment.start, segment.start, segment.end, segment.end))
         
-        merged_segments.append(current_segment)
-        return Path(*merged_segments)
+        points = np.array(points, dtype=complex).reshape(-1, 4)
+        ctrl = np.stack([points.real, points.imag], axis=-1)
+        return np.array(tags, dtype=np.int8), ctrl
     
-    def _lines_are_collinear(self, line1: Line, line2: Line, tolerance: float) -> bool:
-        """Check if two consecutive lines are collinear within tolerance."""
-        # Lines must be connected
-        if abs(line1.end - line2.start) > tolerance:
-            return False
+    def _simplify_curves(self, tags: np.ndarray, ctrl: np.ndarray, threshold: float):
+        """Turn curves that are nearly straight lines into lines, updating ``tags`` and ``ctrl`` in place."""
+        is_quad = tags == _SEG_QUAD
+        curve_idx = np.flatnonzero((tags == _SEG_CUBIC) | is_quad)
+        if len(curve_idx) == 0:
+            return
         
-        # Check if direction vectors are parallel
-        v1 = line1.end - line1.start
-        v2 = line2.end - line2.start
+        # Straightness is tested on cubic control points; quadratics are degree-elevated exactly
+        cubic = ctrl[curve_idx]
+        quad = is_quad[curve_idx]
+        q = cubic[quad, 1]
+        cubic[quad, 1] = cubic[quad, 0] + 2 / 3 * (q - cubic[quad, 0])
+        cubic[quad, 2] = cubic[quad, 3] + 2 / 3 * (q - cubic[quad, 3])
         
-        if abs(v1) < 1e-6 or abs(v2) < 1e-6:
-            return True
+        straight_idx = curve_idx[bezier_straight_mask(cubic, threshold)]
+        tags[straight_idx] = _SEG_LINE
+        ctrl[straight_idx, 1] = ctrl[straight_idx, 0]
+        ctrl[straight_idx, 2] = ctrl[straight_idx, 3]
+    
+    def _merge_collinear_lines(self, tags: np.ndarray, ctrl: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Merge consecutive collinear lines."""
+        count = len(tags)
+        if count < 2:
+            return tags, ctrl
+        
+        # Lines must be connected to their successor to be merge candidates (squared distance, no sqrt)
+        is_line = tags == _SEG_LINE
+        gap = ctrl[:-1, 3] - ctrl[1:, 0]
+        tolerance_sq = tolerance * tolerance
+        connected = (is_line[:-1] & is_line[1:] & ((gap * gap).sum(axis=1) <= tolerance_sq)).tolist()
+        
+        sx, sy = ctrl[:, 0, 0].tolist(), ctrl[:, 0, 1].tolist()
+        ex, ey = ctrl[:, 3, 0].tolist(), ctrl[:, 3, 1].tolist()
         
-        # Cross product should be zero for parallel lines
-        cross_product = v1.real * v2.imag - v1.imag * v2.real
-        return abs(cross_product) / (abs(v1) * abs(v2)) < tolerance
+        # Find where each merged run starts; the run direction depends on its first
+        # segment, so this stays a scalar loop over plain floats
+        run_starts = [0]
+        run_start = 0
+        for i in range(1, count):
+            if connected[i - 1]:
+                # Direction of the merged run so far vs. the next line, compared as
+                # cross^2 < tol^2 * |v1|^2 * |v2|^2 so only multiplies are needed
+                v1x, v1y = ex[i - 1] - sx[run_start], ey[i - 1] - sy[run_start]
+                v2x, v2y = ex[i] - sx[i], ey[i] - sy[i]
+                len1_sq = v1x * v1x + v1y * v1y
+                len2_sq = v2x * v2x + v2y * v2y
+                cross = v1x * v2y - v1y * v2x
+                if len1_sq < 1e-12 or len2_sq < 1e-12 or cross * cross < tolerance_sq * len1_sq * len2_sq:
+                    continue
+            run_starts.append(i)
+            run_start = i
+        
+        if len(run_starts) == count:
+            return tags, ctrl
+        
+        # Runs of more than one segment collapse into a single line from first start to last end
+        firsts = np.array(run_starts)
+        lasts = np.append(firsts[1:] - 1, count - 1)
+        merged_tags = tags[firsts]
+        merged_ctrl = ctrl[firsts]
+        multi = lasts > firsts
+        merged_ctrl[multi, 2] = ctrl[lasts[multi], 3]
+        merged_ctrl[multi, 3] = ctrl[lasts[multi], 3]
+        return merged_tags, merged_ctrl
     
-    def _close_nearly_closed_paths(self, path: Path, tolerance: float) -> Path:
+    def _close_nearly_closed_paths(self, tags: np.ndarray, ctrl: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
         """Close paths that are nearly closed."""
-        if len(path) == 0:
-            return path
+        if len(tags) == 0:
+            return tags, ctrl
         
-        start_point = path[0].start
-        end_point = path[-1].end
+        start_point = ctrl[0, 0]
+        end_point = ctrl[-1, 3]
+        gap = end_point - start_point
         
         # If path is nearly closed, add a closing line
-        if abs(end_point - start_point) < tolerance:
-            segments = list(path)
-            if not isinstance(path[-1], Line) or abs(path[-1].end - start_point) > 1e-6:
-                segments.append(Line(end_point, start_point))
-            return Path(*segments)
+        if gap @ gap < tolerance * tolerance:
+            if tags[-1] != _SEG_LINE or gap @ gap > 1e-12:
+                closing = np.array([[end_point, end_point, start_point, start_point]])
+                return np.append(tags, np.int8(_SEG_LINE)), np.concatenate([ctrl, closing])
         
-        return path
+        return tags, ctrl
     
     def _svg_cleanup_builtin(self, input_svg: str, output_svg: str, result: ConversionResult) -> bool:
         """Built-in SVG cleanup fallback when vpype is not available."""
         try:
-            import shutil
             # Simple fallback: just copy the file
             shutil.copy(input_svg, output_svg)
             result.add_intermediate_file(output_svg, "SVG cleanup (builtin fallback)")
@@ -523,11 +798,43 @@ class AdvancedPipeline(OptimizedPipeline):
             f.write(svg_content)
 
 
+# Pipeline owned by this worker process, built once by _init_worker
+_worker_pipeline = None
+
+
+def _init_worker(config: dict):
+    """Build the pipeline this worker process reuses for every PNG it converts."""
+    global _worker_pipeline
+    _worker_pipeline = AdvancedPipeline(config)
+    # Pool workers exit without running atexit hooks or __del__, but multiprocessing
+    # finalizers do run, so remove the temp directory from one
+    multiprocessing.util.Finalize(_worker_pipeline, _worker_pipeline.cleanup, exitpriority=0)
+
+
+def _convert_one(png_file: str, output_dir: str) -> ConversionResult:
+    """Convert a single PNG with this worker's pipeline."""
+    base_name = os.path.splitext(os.path.basename(png_file))[0]
+    output_path = os.path.join(output_dir, f"{base_name}.svg")
+    
+    # Workers run concurrently, so each input gets its own debug directory
+    if _worker_pipeline.debug:
+        _worker_pipeline.debug_dir = os.path.join("debug_preprocessing", base_name)
+    
+    result = _worker_pipeline.convert(png_file, output_path)
+    # Intermediates live in the worker's temp directory, which the next conversion
+    # overwrites and worker exit removes, so don't hand their paths back
+    result.intermediate_files = [f for f in result.intermediate_files
+                                 if not f['path'].startswith(_worker_pipeline._tmp_root)]
+    return result
+
+
 # Main function for direct execution
 if __name__ == "__main__":
+    import sys
     import tempfile
     import glob
-    import shutil
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
     
     # Create a simple test configuration
     config = {
@@ -535,6 +842,14 @@ if __name__ == "__main__":
         'debug': True
     }
     
+    # `--check-potrace-frame` compares the CLI and pypotrace traces of the committed debug PNG instead
+    if "--check-potrace-frame" in sys.argv:
+        pipeline = AdvancedPipeline(config)
+        sample_png = os.path.join(os.path.dirname(__file__), 'debug_preprocessing', '10_preprocessed_final.png')
+        ok = pipeline.check_potrace_frame(sample_png)
+        pipeline.cleanup()
+        exit(0 if ok else 1)
+    
     # Create output directory
     output_dir = "svg_outputs"
     os.makedirs(output_dir, exist_ok=True)
@@ -550,25 +865,18 @@ if __name__ == "__main__":
     
     print(f"Found {len(png_files)} PNG files to process")
     
-    # Create pipeline instance
-    pipeline = AdvancedPipeline(config)
+    # Files are independent, so convert them in parallel across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_worker, initargs=(config,)) as executor:
+        results = list(executor.map(partial(_convert_one, output_dir=output_dir), png_files))
     
-    # Process each PNG file
     successful_conversions = 0
     total_processing_time = 0
     
-    for i, png_file in enumerate(png_files, 1):
-        print(f"\n--- Processing {i}/{len(png_files)}: {os.path.basename(png_file)} ---")
-        
-        # Create output filename
-        base_name = os.path.splitext(os.path.basename(png_file))[0]
-        output_path = os.path.join(output_dir, f"{base_name}.svg")
-        
-        # Run the pipeline
-        result = pipeline.convert(png_file, output_path)
+    for i, (png_file, result) in enumerate(zip(png_files, results), 1):
+        print(f"\n--- Processed {i}/{len(png_files)}: {os.path.basename(png_file)} ---")
         
         if result.success:
-            print(f"✅ Success: {output_path}")
+            print(f"✅ Success: {result.output_path}")
             print(f"   Processing time: {result.processing_time:.2f} seconds")
             successful_conversions += 1
             total_processing_time += result.processing_time
@@ -3,6 +3,9 @@ Base pipeline classes and utilities.
 """
 
 import os
+import shutil
+import subprocess
+import tempfile
 import time
 from typing import List, Dict, Any
 
@@ -43,11 +46,25 @@ class BasePipeline:
         self.config = config
         self.temp_dir = config.get('temp_dir', '/tmp')
         self.name = "base"
+        # Per-instance directory so concurrent conversions never share temp files
+        # (no temp_dir configured means the system default, as tempfile.gettempdir())
+        self._tmp_root = tempfile.mkdtemp(prefix="pipeline_", dir=config.get('temp_dir'))
+    
+    def __del__(self):
+        self.cleanup()
+    
+    def cleanup(self):
+        """Remove this pipeline's temporary directory and everything in it."""
+        tmp_root = getattr(self, '_tmp_root', None)
+        if tmp_root:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+            self._tmp_root = None
     
     def get_temp_path(self, filename: str) -> str:
         """Generate a temporary file path."""
-        import tempfile
-        return os.path.join(tempfile.gettempdir(), f"pipeline_{filename}")
+        if self._tmp_root is None:
+            raise RuntimeError(f"{type(self).__name__} temp directory was removed by cleanup()")
+        return os.path.join(self._tmp_root, filename)
     
     def validate_input(self, input_path: str) -> bool:
         """Validate input file."""
@@ -60,14 +77,20 @@ class BasePipeline:
         except:
             return 0
     
-    def run_subprocess(self, command: List[str], description: str):
-        """Run a subprocess command."""
-        import subprocess
+    def run_subprocess(self, command: List[str], description: str, input_data: bytes = None):
+        """Run a subprocess command.
+        
+        When ``input_data`` is given it is piped to stdin and stdout is returned as bytes.
+        """
         try:
-            result = subprocess.run(command, capture_output=True, text=True, check=True)
-            return True, result.stdout, result.stderr
+            if input_data is None:
+                result = subprocess.run(command, capture_output=True, text=True, check=True)
+                return True, result.stdout, result.stderr
+            result = subprocess.run(command, input=input_data, capture_output=True, check=True)
+            return True, result.stdout, result.stderr.decode(errors='replace')
         except subprocess.CalledProcessError as e:
-            return False, e.stdout, e.stderr
+            stderr = e.stderr.decode(errors='replace') if isinstance(e.stderr, bytes) else e.stderr
+            return False, e.stdout, stderr
         except Exception as e:
             return False, "", str(e)
     
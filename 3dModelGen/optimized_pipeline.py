@@ -2,9 +2,12 @@
 Optimized pipeline for PNG to SVG conversion.
 """
 
+import io
 import os
+import shutil
 from typing import List
 from loguru import logger
+from PIL import Image
 
 from base_pipeline import BasePipeline, ConversionResult
 
@@ -24,30 +27,21 @@ class OptimizedPipeline(BasePipeline):
         """Check if all dependencies are available."""
         return True
     
-    def _png_to_pbm(self, png_path: str, pbm_path: str, result: ConversionResult) -> bool:
-        """Convert PNG to PBM format for potrace."""
-        try:
-            from PIL import Image
-            
-            # Read PNG and convert to 1-bit black and white
-            img = Image.open(png_path)
-            if img.mode != '1':
-                img = img.convert('1')
-            
-            # Save as PBM
-            img.save(pbm_path, 'PPM')
-            return True
-            
-        except Exception as e:
-            result.error_message = f"PNG to PBM conversion failed: {str(e)}"
-            logger.error(f"PNG to PBM conversion failed: {str(e)}")
-            return False
+    def _png_to_pbm_bytes(self, png_path: str) -> bytes:
+        """Encode PNG as PBM in memory so it can be piped to potrace."""
+        # Read PNG and convert to 1-bit black and white
+        img = Image.open(png_path)
+        if img.mode != '1':
+            img = img.convert('1')
+        
+        buf = io.BytesIO()
+        img.save(buf, 'PPM')
+        return buf.getvalue()
     
     def _svg_cleanup_builtin(self, input_svg: str, output_svg: str, result: ConversionResult) -> bool:
         """Built-in SVG cleanup fallback."""
         try:
             # Simple copy for now - implement actual cleanup if needed
-            import shutil
             shutil.copy(input_svg, output_svg)
             result.add_intermediate_file(output_svg, "Built-in SVG cleanup")
             return True
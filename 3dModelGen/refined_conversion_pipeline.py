@@ -4,149 +4,194 @@ Refined Conversion Pipeline using exact logic from refined_png_to_dxf_smart_curv
 PNG → SVG (potrace) → DXF with smart curve detection
 """
 
+import contextlib
+import io
 import os
 import subprocess
+import sys
 import math
+import re
 import xml.etree.ElementTree as ET
+import numpy as np
+from typing import Optional
 from PIL import Image
 import ezdxf
-from svgpathtools import svg2paths2, Line, QuadraticBezier, CubicBezier, Arc
+from svgpathtools import svg2paths2, Line, QuadraticBezier, CubicBezier
 
-def preprocess_png_image(input_path: str, output_path: str, processing_type: str = "full_processing") -> bool:
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+# Images smaller than this skip connected-component speckle filtering
+MIN_COMPONENT_FILTER_PIXELS = 512 * 512
+# Structuring element for the noise-removing morphological open
+OPEN_KERNEL = np.ones((2, 2), np.uint8)
+# Images up to this size use global histogram equalization instead of tiled CLAHE
+EQUALIZE_HIST_MAX_PIXELS = 256 * 256
+# Shared CLAHE instance, built once per process
+CLAHE = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8)) if CV2_AVAILABLE else None
+
+def preprocess_png_image(input_path: str, output_path: str = None, processing_type: str = "full_processing",
+                         debug: bool = False, debug_dir: str = "debug_preprocessing") -> Optional[np.ndarray]:
     """
     EXACT preprocessing from advanced_pipeline.py _preprocess_image_advanced method.
     This is the original code that creates 10_preprocessed_final.png
+    
+    The result is also written to output_path when one is given; intermediate
+    images are only written to debug_dir when debug is True.
+    
+    Returns the binary uint8 image, or None on failure. This used to be a bool:
+    test the result with `is None`, since `if not result` is ambiguous for an array.
     """
     try:
-        import cv2
-        import numpy as np
-        from PIL import ImageEnhance
+        if not CV2_AVAILABLE:
+            raise ImportError("OpenCV (cv2) is required for preprocessing")
         
         # Read image
         img = Image.open(input_path)
         
         # Create debug directory
-        debug_dir = "debug_preprocessing"
-        os.makedirs(debug_dir, exist_ok=True)
+        if debug:
+            os.makedirs(debug_dir, exist_ok=True)
         
         # Convert to grayscale and save
         if img.mode != 'L':
             img = img.convert('L')
-        img.save(f"{debug_dir}/01_original_grayscale.png")
+        if debug:
+            img.save(f"{debug_dir}/01_original_grayscale.png")
         
         # Convert PIL to OpenCV format
         img_array = np.array(img)
         
         # Step 1: Noise reduction (preserve edges)
         blurred = cv2.medianBlur(img_array, 3)
-        Image.fromarray(blurred).save(f"{debug_dir}/02_median_blur.png")
+        if debug:
+            Image.fromarray(blurred).save(f"{debug_dir}/02_median_blur.png")
         
         # Step 2: Morphological opening to remove noise
-        kernel = np.ones((2,2), np.uint8)
-        opened = cv2.morphologyEx(blurred, cv2.MORPH_OPEN, kernel, iterations=1)
-        Image.fromarray(opened).save(f"{debug_dir}/03_morphology_open.png")
-        
-        # Step 3: CLAHE for local contrast enhancement
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        contrast_enhanced = clahe.apply(opened)
-        Image.fromarray(contrast_enhanced).save(f"{debug_dir}/04_clahe_contrast.png")
+        opened = cv2.morphologyEx(blurred, cv2.MORPH_OPEN, OPEN_KERNEL, iterations=1)
+        if debug:
+            Image.fromarray(opened).save(f"{debug_dir}/03_morphology_open.png")
+        
+        # Step 3: CLAHE for local contrast enhancement (small images have too few
+        # pixels per tile for it to differ from plain histogram equalization)
+        if opened.size <= EQUALIZE_HIST_MAX_PIXELS:
+            contrast_enhanced = cv2.equalizeHist(opened)
+        else:
+            contrast_enhanced = CLAHE.apply(opened)
+        if debug:
+            Image.fromarray(contrast_enhanced).save(f"{debug_dir}/04_clahe_contrast.png")
         
         # Step 4: Dual thresholding approach
-        # Adaptive threshold
-        adaptive_thresh = cv2.adaptiveThreshold(
-            contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 
-            blockSize=15, C=1
-        )
-        Image.fromarray(adaptive_thresh).save(f"{debug_dir}/05a_adaptive_threshold.png")
+        # Adaptive threshold (only a debug diagnostic; Otsu is the one used)
+        if debug:
+            adaptive_thresh = cv2.adaptiveThreshold(
+                contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 
+                blockSize=15, C=1
+            )
+            Image.fromarray(adaptive_thresh).save(f"{debug_dir}/05a_adaptive_threshold.png")
         
         # Otsu threshold  
         _, otsu_thresh = cv2.threshold(contrast_enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        Image.fromarray(otsu_thresh).save(f"{debug_dir}/05b_otsu_threshold.png")
+        if debug:
+            Image.fromarray(otsu_thresh).save(f"{debug_dir}/05b_otsu_threshold.png")
         
         # Choose the better threshold (using Otsu as in original)
         chosen_thresh = otsu_thresh
         threshold_method = "otsu"
         
-        Image.fromarray(chosen_thresh).save(f"{debug_dir}/06_chosen_threshold_{threshold_method}.png")
+        if debug:
+            Image.fromarray(chosen_thresh).save(f"{debug_dir}/06_chosen_threshold_{threshold_method}.png")
         
         # Check if we should skip post-processing (threshold_only mode)
         if processing_type == "threshold_only":
             print("DEBUG: Using threshold-only mode - skipping post-processing")
-            processed_img = Image.fromarray(chosen_thresh)
-            processed_img.save(f"{debug_dir}/10_preprocessed_final.png")
-            processed_img.save(output_path)
-            print(f"DEBUG: Preprocessing complete (threshold-only). Check {debug_dir}/ for results.")
-            return True
+            if debug:
+                cv2.imwrite(f"{debug_dir}/10_preprocessed_final.png", chosen_thresh)
+            if output_path:
+                cv2.imwrite(output_path, chosen_thresh)
+            if debug:
+                print(f"DEBUG: Preprocessing complete (threshold-only). Check {debug_dir}/ for results.")
+            return chosen_thresh
         
         # Continue with original post-processing (steps 07-10)
         img_array = chosen_thresh
         
         # Component analysis and filtering (Step 07)
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(img_array, connectivity=8)
         total_pixels = img_array.shape[0] * img_array.shape[1]
         
-        # Calculate dynamic threshold based on image complexity
-        if num_labels > 50:  # Complex image with many components
-            min_area = max(20, total_pixels * 0.00005)  # Keep more detail (0.005% instead of 0.01%)
-            complexity = "complex"
-        elif num_labels > 20:  # Moderately complex
-            min_area = max(30, total_pixels * 0.0001)   # Standard filtering
-            complexity = "moderate"
-        else:  # Simple image
-            min_area = max(50, total_pixels * 0.0002)   # More aggressive for simple images
-            complexity = "simple"
-        
-        print(f"DEBUG: Image complexity: {complexity}, min_area threshold: {min_area}")
-        
-        # Create clean binary image
-        clean_img = np.zeros_like(img_array)
-        kept_components = 0
-        for i in range(1, num_labels):  # Skip background (label 0)
-            if stats[i, cv2.CC_STAT_AREA] >= min_area:
-                clean_img[labels == i] = 255
-                kept_components += 1
-        
-        print(f"DEBUG: Kept {kept_components} components out of {num_labels-1}")
-        Image.fromarray(clean_img).save(f"{debug_dir}/07_component_filtered.png")
-        
-        # Step 5: Gentle final cleanup (preserve detail)
-        # Use smaller kernel for final morphology
-        kernel_final = np.ones((1,1), np.uint8)  # Minimal final cleanup
-        clean_img = cv2.morphologyEx(clean_img, cv2.MORPH_CLOSE, kernel_final, iterations=1)
-        Image.fromarray(clean_img).save(f"{debug_dir}/08_final_morphology.png")
-        
-        # Convert back to PIL Image
-        processed_img = Image.fromarray(clean_img)
-        
-        # Moderate contrast boost (preserve detail)
-        enhancer = ImageEnhance.Contrast(processed_img)
-        processed_img = enhancer.enhance(1.5)  # Reduced from 2.0
-        processed_img.save(f"{debug_dir}/09_final_contrast.png")
-        
-        processed_img.save(f"{debug_dir}/10_preprocessed_final.png")
-        processed_img.save(output_path)
-        print(f"DEBUG: Preprocessing complete. Check {debug_dir}/ for intermediate results.")
+        if total_pixels < MIN_COMPONENT_FILTER_PIXELS:
+            # Small images have little speckle to remove, skip the labelling pass
+            print(f"DEBUG: Small image ({total_pixels} pixels), skipping component filtering")
+            clean_img = img_array
+        else:
+            num_labels, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+                img_array, 8, cv2.CV_32S, getattr(cv2, 'CCL_BBDT', cv2.CCL_DEFAULT)
+            )
+            
+            # Calculate dynamic threshold based on image complexity
+            if num_labels > 50:  # Complex image with many components
+                min_area = max(20, total_pixels * 0.00005)  # Keep more detail (0.005% instead of 0.01%)
+                complexity = "complex"
+            elif num_labels > 20:  # Moderately complex
+                min_area = max(30, total_pixels * 0.0001)   # Standard filtering
+                complexity = "moderate"
+            else:  # Simple image
+                min_area = max(50, total_pixels * 0.0002)   # More aggressive for simple images
+                complexity = "simple"
+            
+            print(f"DEBUG: Image complexity: {complexity}, min_area threshold: {min_area}")
+            
+            # Create clean binary image with a per-label lookup table (one pass over the label map)
+            areas = stats[:, cv2.CC_STAT_AREA]
+            lut = np.zeros(num_labels, dtype=np.uint8)
+            lut[1:] = np.where(areas[1:] >= min_area, 255, 0)  # Skip background (label 0)
+            clean_img = lut[labels]
+            kept_components = int((lut[1:] == 255).sum())
+            
+            print(f"DEBUG: Kept {kept_components} components out of {num_labels-1}")
+        
+        if debug:
+            Image.fromarray(clean_img).save(f"{debug_dir}/07_component_filtered.png")
         
-        return True
+        # Moderate contrast boost (preserve detail) around the image mean, same as
+        # PIL's ImageEnhance.Contrast but with cv2's saturating arithmetic
+        contrast = 1.5  # Reduced from 2.0
+        mean = int(cv2.mean(clean_img)[0] + 0.5)
+        processed_img = cv2.addWeighted(clean_img, contrast, clean_img, 0, mean * (1 - contrast))
+        if debug:
+            cv2.imwrite(f"{debug_dir}/09_final_contrast.png", processed_img)
+            cv2.imwrite(f"{debug_dir}/10_preprocessed_final.png", processed_img)
+        
+        if output_path:
+            cv2.imwrite(output_path, processed_img)
+        if debug:
+            print(f"DEBUG: Preprocessing complete. Check {debug_dir}/ for intermediate results.")
+        
+        return processed_img
         
     except Exception as e:
         print(f"   ❌ Preprocessing failed: {e}")
-        return False
+        return None
 
 def png_to_svg_potrace(png_path: str, svg_path: str) -> bool:
     """Convert PNG to SVG using potrace with balanced parameters."""
     try:
-        # Create temporary PBM file
-        pbm_path = png_path.replace('.png', '.pbm')
-        
-        # Convert PNG to PBM
-        img = Image.open(png_path)
-        if img.mode != 'L':
-            img = img.convert('L')
-        
-        # Convert to 1-bit black and white
-        img = img.point(lambda x: 0 if x < 128 else 255, '1')
-        img.save(pbm_path, 'PPM')
+        arr = np.asarray(Image.open(png_path).convert('L'))
+    except Exception as e:
+        print(f"   ❌ PNG to SVG conversion failed: {e}")
+        return False
+    
+    return ndarray_to_svg_potrace(arr, svg_path)
+
+def ndarray_to_svg_potrace(arr: np.ndarray, svg_path: str) -> bool:
+    """Trace a grayscale uint8 image (e.g. from preprocess_png_image) to SVG with potrace."""
+    try:
+        # Convert to a raw (P4) PBM in memory: threshold and bit-pack rows in NumPy (black = 1)
+        h, w = arr.shape
+        pbm_bytes = f"P4\n{w} {h}\n".encode() + np.packbits(arr < 128, axis=1).tobytes()
         
         # Build potrace command with balanced settings
         command = [
@@ -157,39 +202,50 @@ def png_to_svg_potrace(png_path: str, svg_path: str) -> bool:
             "--longcurve",            # Preserve long smooth curves
             "--svg",                  # Output format
             "--output", svg_path,     # Output file
-            pbm_path                  # Input file
+            "-"                       # Read the bitmap from stdin
         ]
         
-        # Run potrace
-        result = subprocess.run(command, capture_output=True, text=True)
-        
-        # Clean up temporary PBM file
-        if os.path.exists(pbm_path):
-            os.remove(pbm_path)
+        # Run potrace, piping the PBM over stdin instead of a temporary file
+        result = subprocess.run(command, input=pbm_bytes, capture_output=True)
         
         if result.returncode == 0 and os.path.exists(svg_path):
             print(f"   ✅ PNG to SVG conversion successful (potrace)")
             return True
         else:
-            print(f"   ❌ potrace failed: {result.stderr}")
+            print(f"   ❌ potrace failed: {result.stderr.decode(errors='replace')}")
             return False
             
     except Exception as e:
         print(f"   ❌ PNG to SVG conversion failed: {e}")
         return False
 
+# Root <svg> start tag and its attributes, for reading the size without parsing the document
+_SVG_ROOT_TAG_RE = re.compile(rb'<svg\b[^>]*>')
+_SVG_ATTRIBUTE_RE = re.compile(rb'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
 def get_svg_dimensions(svg_path: str):
     """Extract SVG dimensions and calculate scaling factor."""
     try:
-        tree = ET.parse(svg_path)
-        root = tree.getroot()
+        # The size is on the root element, which potrace writes in the first few
+        # hundred bytes; only fall back to a full parse if it is not in the head
+        with open(svg_path, 'rb') as f:
+            head = f.read(4096)
+        
+        root_tag = _SVG_ROOT_TAG_RE.search(head)
+        if root_tag:
+            attributes = {
+                match.group(1).decode(): (match.group(2) if match.group(2) is not None else match.group(3)).decode()
+                for match in _SVG_ATTRIBUTE_RE.finditer(root_tag.group(0))
+            }
+        else:
+            attributes = ET.parse(svg_path).getroot().attrib
         
         # Try to get width and height from SVG
-        width = root.get('width')
-        height = root.get('height')
+        width = attributes.get('width')
+        height = attributes.get('height')
         
         # Try to get viewBox
-        viewBox = root.get('viewBox')
+        viewBox = attributes.get('viewBox')
         
         if viewBox:
             # Parse viewBox: "min-x min-y width height"
@@ -214,12 +270,17 @@ def get_svg_dimensions(svg_path: str):
         print(f"   ⚠️  Could not parse SVG dimensions: {e}")
         return None, None
 
+# Cubic Bezier basis weights at the sample parameters used by is_essentially_straight
+_STRAIGHT_T = np.array([0.25, 0.5, 0.75])
+_CUBIC_WEIGHTS = np.stack([(1 - _STRAIGHT_T)**3, 3 * (1 - _STRAIGHT_T)**2 * _STRAIGHT_T,
+                           3 * (1 - _STRAIGHT_T) * _STRAIGHT_T**2, _STRAIGHT_T**3], axis=1)
+
 def is_essentially_straight(segment, tolerance=0.05):
     """Check if a curve is essentially straight and should be treated as a line."""
     try:
         # Get start and end points
-        start = complex(segment.start.real, segment.start.imag)
-        end = complex(segment.end.real, segment.end.imag)
+        start = complex(segment.start)
+        end = complex(segment.end)
         
         # Calculate direct distance
         direct_distance = abs(end - start)
@@ -227,44 +288,67 @@ def is_essentially_straight(segment, tolerance=0.05):
         if direct_distance < 1e-6:  # Too short to matter
             return True
         
-        # Sample points along the curve
-        max_deviation = 0
-        for t in [0.25, 0.5, 0.75]:
-            try:
-                point = segment.point(t)
-                curve_point = complex(point.real, point.imag)
-                
-                # Calculate expected point on straight line
-                expected_point = start + t * (end - start)
-                
-                # Calculate deviation from straight line
-                deviation = abs(curve_point - expected_point)
-                max_deviation = max(max_deviation, deviation)
-                
-            except Exception:
-                continue
+        # Decide from the control points when possible. Relative to the straight line
+        # through the chord's third points, the curve is off by 3t(1-t)((1-t)e1 + t*e2)
+        # (quadratic: 2t(1-t)e), so the samples can be bounded without evaluating them
+        cls = segment.__class__
+        chord = end - start
+        limit = tolerance * direct_distance
+        if cls is CubicBezier:
+            e1 = segment.control1 - start - chord / 3
+            e2 = segment.control2 - start - 2 * chord / 3
+            if 0.75 * max(abs(e1), abs(e2)) < limit:  # Upper bound over all samples
+                return True
+            if 0.375 * abs(e1 + e2) >= limit:  # Exact deviation of the t = 0.5 sample
+                return False
+            points = _CUBIC_WEIGHTS @ np.array([start, segment.control1, segment.control2, end])
+        elif cls is QuadraticBezier:
+            # The t = 0.5 sample is always the furthest one
+            return bool(0.5 * abs(segment.control - start - chord / 2) < limit)
+        else:
+            points = np.array([segment.point(t) for t in _STRAIGHT_T])
+        
+        # Deviation from the matching points on the straight line
+        expected = start + _STRAIGHT_T * chord
+        max_deviation = np.abs(points - expected).max()
         
         # If maximum deviation is small relative to length, treat as straight
         relative_deviation = max_deviation / direct_distance
-        return relative_deviation < tolerance
+        return bool(relative_deviation < tolerance)
         
     except Exception:
         return False
 
+def arc_angles(segment):
+    """Return (start, end) angles in radians of a circular arc, ordered counter-clockwise."""
+    # Angles straight from the endpoints around the centre; one atan2 each
+    center = segment.center
+    start_angle = math.atan2(segment.start.imag - center.imag, segment.start.real - center.real)
+    end_angle = math.atan2(segment.end.imag - center.imag, segment.end.real - center.real)
+    
+    # A negative sweep runs clockwise, so the same arc goes counter-clockwise from end to start
+    if not segment.sweep:
+        start_angle, end_angle = end_angle, start_angle
+    return start_angle, end_angle
+
 def is_significant_arc(segment, min_radius=2.0, min_angle=0.1):
     """Check if an arc is significant enough to preserve as an arc."""
     try:
         if not hasattr(segment, 'radius'):
             return False
-            
-        radius = float(segment.radius)
+        
+        # svgpathtools stores the radii as rx + ry*j; only circular arcs map to a DXF ARC
+        rx, ry = segment.radius.real, segment.radius.imag
+        if abs(rx - ry) > 1e-9 * max(rx, ry):
+            return False
+        
+        radius = rx
         if radius < min_radius:
             return False
             
         # Check if arc spans significant angle
         try:
-            start_angle = segment.start_angle()
-            end_angle = segment.end_angle()
+            start_angle, end_angle = arc_angles(segment)
             angle_diff = abs(end_angle - start_angle)
             
             # Handle wraparound
@@ -279,6 +363,51 @@ def is_significant_arc(segment, min_radius=2.0, min_angle=0.1):
     except Exception:
         return False
 
+# Segment type codes for the per-sub-path arrays built by segments_to_arrays
+# (quadratic Beziers are stored as their exact cubic equivalent)
+SEG_LINE, SEG_CUBIC, SEG_ARC = 0, 1, 2
+
+def segments_to_arrays(sub_path, scale_factor):
+    """
+    Collect segment type codes, scaled joint points and scaled curve control points
+    for a continuous sub-path.
+    
+    Segment k runs from joints[k] to joints[k + 1], so a point shared by neighbouring
+    segments is read and scaled once; controls[k] holds the two inner cubic control points.
+    """
+    n = len(sub_path)
+    types = np.empty(n, dtype=np.int8)
+    joints = np.empty(n + 1, dtype=np.complex128)
+    controls = np.zeros((n, 2), dtype=np.complex128)
+    
+    # continuous_subpaths() splits wherever an end differs from the next start,
+    # so only the first segment's start needs reading
+    joints[0] = sub_path[0].start
+    
+    # Dispatch on the exact class (identity compare, no MRO walk); lines and
+    # cubics are what potrace emits, so they are checked first
+    for k, segment in enumerate(sub_path):
+        cls = segment.__class__
+        end = segment.end
+        joints[k + 1] = end
+        if cls is Line:
+            types[k] = SEG_LINE
+        elif cls is CubicBezier:
+            types[k] = SEG_CUBIC
+            controls[k] = segment.control1, segment.control2
+        elif cls is QuadraticBezier:
+            # Degree elevation: c1 = p0 + 2/3 (q - p0), c2 = p3 + 2/3 (q - p3)
+            start, control = segment.start, segment.control
+            types[k] = SEG_CUBIC
+            controls[k] = start + (2 / 3) * (control - start), end + (2 / 3) * (control - end)
+        else:  # Arc
+            types[k] = SEG_ARC
+    
+    # Split into (x, y) and scale every coordinate in one pass
+    joints_xy = np.stack((joints.real, joints.imag), axis=-1) * scale_factor
+    controls_xy = np.stack((controls.real, controls.imag), axis=-1) * scale_factor
+    return types, joints_xy, controls_xy
+
 def smart_curve_preserving_svg_to_dxf(svg_path: str, output_path: str, target_size_mm=100) -> bool:
     """
     Smart SVG to DXF converter that only creates curves when significantly curved.
@@ -317,10 +446,6 @@ def smart_curve_preserving_svg_to_dxf(svg_path: str, output_path: str, target_si
         doc.units = ezdxf.units.MM
         msp = doc.modelspace()
         
-        total_entities = 0
-        entity_counts = {"lines": 0, "splines": 0, "arcs": 0, "polylines": 0}
-        curve_rejections = {"too_straight": 0, "too_small": 0, "too_short": 0}
-        
         # Smart curve detection parameters
         MIN_CURVE_LENGTH = 1.0 * scale_factor  # Minimum length to consider for curves
         STRAIGHTNESS_TOLERANCE = 0.05
@@ -331,6 +456,23 @@ def smart_curve_preserving_svg_to_dxf(svg_path: str, output_path: str, target_si
         print(f"      • Straightness tolerance: {STRAIGHTNESS_TOLERANCE}")
         print(f"      • Min arc radius: {MIN_ARC_RADIUS:.2f}mm")
         
+        # Bind names used per segment to locals so the loop avoids global/attribute lookups
+        sf = scale_factor
+        to_arrays = segments_to_arrays
+        is_straight = is_essentially_straight
+        hypot = math.hypot
+        
+        # Rejection counters, written back to the summary dict after the loop
+        rej_straight = rej_small = rej_short = 0
+        
+        # Entity geometry is buffered during the traversal and added to the
+        # modelspace in one pass per entity type afterwards
+        lines_out, polylines_out, splines_out, arcs_out = [], [], [], []
+        buffer_line = lines_out.append
+        buffer_poly = polylines_out.append
+        buffer_spline = splines_out.append
+        buffer_arc = arcs_out.append
+        
         for i, path in enumerate(paths):
             if not path:
                 continue
@@ -346,123 +488,106 @@ def smart_curve_preserving_svg_to_dxf(svg_path: str, output_path: str, target_si
                     # Collect consecutive line segments
                     current_polyline_points = []
                     
-                    for k, segment in enumerate(sub_path):
-                        if isinstance(segment, Line):
-                            # Add to current polyline
+                    # Gather type codes and scaled points for the whole sub-path
+                    types, joints, controls = to_arrays(sub_path, sf)
+                    joints = joints.tolist()
+                    controls = controls.tolist()
+                    
+                    for k, (segment, seg_type) in enumerate(zip(sub_path, types.tolist())):
+                        end = joints[k + 1]
+                        
+                        if seg_type == SEG_LINE:
+                            # Add to current polyline; its start is the previous end
                             if not current_polyline_points:
-                                current_polyline_points.append(
-                                    (float(segment.start.real) * scale_factor, float(segment.start.imag) * scale_factor)
-                                )
-                            current_polyline_points.append(
-                                (float(segment.end.real) * scale_factor, float(segment.end.imag) * scale_factor)
-                            )
+                                current_polyline_points.append(joints[k])
+                            current_polyline_points.append(end)
                             
                         else:
+                            # Process curve segment with smart filtering
+                            start = joints[k]
+                            segment_length = hypot(end[0] - start[0], end[1] - start[1])
+                            
+                            # Straight curves and insignificant arcs become part of the
+                            # current polyline run instead of separate LINE entities
+                            if segment_length >= MIN_CURVE_LENGTH:
+                                if seg_type != SEG_ARC:
+                                    as_line = is_straight(segment, STRAIGHTNESS_TOLERANCE)
+                                    if as_line:
+                                        rej_straight += 1
+                                else:
+                                    as_line = not is_significant_arc(segment, MIN_ARC_RADIUS)
+                                    if as_line:
+                                        rej_small += 1
+                                
+                                if as_line:
+                                    if not current_polyline_points:
+                                        current_polyline_points.append(start)
+                                    current_polyline_points.append(end)
+                                    continue
+                            
                             # Process accumulated line segments as polyline
                             if len(current_polyline_points) >= 2:
-                                msp.add_lwpolyline(current_polyline_points)
-                                entity_counts["polylines"] += 1
-                                total_entities += 1
-                                current_polyline_points = []
-                            
-                            # Process curve segment with smart filtering
-                            segment_length = 0
-                            try:
-                                segment_length = abs(segment.end - segment.start) * scale_factor
-                            except:
-                                segment_length = 0
+                                buffer_poly(current_polyline_points)
+                            current_polyline_points = []
                                 
                             # Skip very short segments
                             if segment_length < MIN_CURVE_LENGTH:
-                                curve_rejections["too_short"] += 1
+                                rej_short += 1
                                 continue
                                 
-                            if isinstance(segment, (QuadraticBezier, CubicBezier)):
-                                # Check if essentially straight
-                                if is_essentially_straight(segment, STRAIGHTNESS_TOLERANCE):
-                                    # Convert to line instead
-                                    start = (float(segment.start.real) * scale_factor, float(segment.start.imag) * scale_factor)
-                                    end = (float(segment.end.real) * scale_factor, float(segment.end.imag) * scale_factor)
-                                    msp.add_line(start, end)
-                                    entity_counts["lines"] += 1
-                                    total_entities += 1
-                                    curve_rejections["too_straight"] += 1
-                                else:
-                                    # Create spline
-                                    control_points = []
+                            if seg_type != SEG_ARC:
+                                # Create spline
+                                buffer_spline([start, *controls[k], end])
                                     
-                                    if isinstance(segment, QuadraticBezier):
-                                        control_points = [
-                                            (float(segment.start.real) * scale_factor, float(segment.start.imag) * scale_factor),
-                                            (float(segment.control.real) * scale_factor, float(segment.control.imag) * scale_factor),
-                                            (float(segment.end.real) * scale_factor, float(segment.end.imag) * scale_factor)
-                                        ]
-                                        degree = 2
-                                    else:  # CubicBezier
-                                        control_points = [
-                                            (float(segment.start.real) * scale_factor, float(segment.start.imag) * scale_factor),
-                                            (float(segment.control1.real) * scale_factor, float(segment.control1.imag) * scale_factor),
-                                            (float(segment.control2.real) * scale_factor, float(segment.control2.imag) * scale_factor),
-                                            (float(segment.end.real) * scale_factor, float(segment.end.imag) * scale_factor)
-                                        ]
-                                        degree = 3
+                            else:
+                                try:
+                                    center = (segment.center.real * sf, segment.center.imag * sf)
+                                    radius = segment.radius.real * sf
+                                    start_angle, end_angle = map(math.degrees, arc_angles(segment))
                                     
-                                    try:
-                                        spline = msp.add_open_spline(control_points, degree=degree)
-                                        entity_counts["splines"] += 1
-                                        total_entities += 1
-                                    except Exception:
-                                        # Fallback to line
-                                        start = (float(segment.start.real) * scale_factor, float(segment.start.imag) * scale_factor)
-                                        end = (float(segment.end.real) * scale_factor, float(segment.end.imag) * scale_factor)
-                                        msp.add_line(start, end)
-                                        entity_counts["lines"] += 1
-                                        total_entities += 1
-                                        
-                            elif isinstance(segment, Arc):
-                                # Check if arc is significant
-                                if is_significant_arc(segment, MIN_ARC_RADIUS):
-                                    try:
-                                        center = (float(segment.center.real) * scale_factor, float(segment.center.imag) * scale_factor)
-                                        radius = float(segment.radius) * scale_factor
-                                        start_angle = math.degrees(segment.start_angle())
-                                        end_angle = math.degrees(segment.end_angle())
-                                        
-                                        # Ensure proper angle direction
-                                        if end_angle < start_angle:
-                                            end_angle += 360
-                                        
-                                        msp.add_arc(center, radius, start_angle, end_angle)
-                                        entity_counts["arcs"] += 1
-                                        total_entities += 1
-                                        
-                                    except Exception:
-                                        # Fallback to line
-                                        start = (float(segment.start.real) * scale_factor, float(segment.start.imag) * scale_factor)
-                                        end = (float(segment.end.real) * scale_factor, float(segment.end.imag) * scale_factor)
-                                        msp.add_line(start, end)
-                                        entity_counts["lines"] += 1
-                                        total_entities += 1
-                                else:
-                                    # Convert small arc to line
-                                    start = (float(segment.start.real) * scale_factor, float(segment.start.imag) * scale_factor)
-                                    end = (float(segment.end.real) * scale_factor, float(segment.end.imag) * scale_factor)
-                                    msp.add_line(start, end)
-                                    entity_counts["lines"] += 1
-                                    total_entities += 1
-                                    curve_rejections["too_small"] += 1
+                                    # Ensure proper angle direction
+                                    if end_angle < start_angle:
+                                        end_angle += 360
+                                    
+                                    buffer_arc((center, radius, start_angle, end_angle))
+                                    
+                                except Exception:
+                                    # Fallback to line
+                                    buffer_line((start, end))
                     
                     # Process any remaining line segments
                     if len(current_polyline_points) >= 2:
-                        msp.add_lwpolyline(current_polyline_points)
-                        entity_counts["polylines"] += 1
-                        total_entities += 1
+                        buffer_poly(current_polyline_points)
                         
                 except Exception as e:
                     if i < 3:  # Only show errors for first few paths
                         print(f"       ⚠️  Error processing sub-path: {e}")
                     continue
         
+        # Create the buffered entities
+        ec_lines = ec_splines = 0
+        for start, end in lines_out:
+            msp.add_line(start, end)
+        for points in polylines_out:
+            msp.add_lwpolyline(points)
+        for center, radius, start_angle, end_angle in arcs_out:
+            msp.add_arc(center, radius, start_angle, end_angle)
+        for control_points in splines_out:
+            try:
+                msp.add_open_spline(control_points, degree=3)
+                ec_splines += 1
+            except Exception:
+                # Fallback to line
+                msp.add_line(control_points[0], control_points[-1])
+                ec_lines += 1
+        ec_lines += len(lines_out)
+        ec_polys = len(polylines_out)
+        ec_arcs = len(arcs_out)
+        
+        entity_counts = {"lines": ec_lines, "splines": ec_splines, "arcs": ec_arcs, "polylines": ec_polys}
+        curve_rejections = {"too_straight": rej_straight, "too_small": rej_small, "too_short": rej_short}
+        total_entities = ec_lines + ec_splines + ec_arcs + ec_polys
+        
         # Save DXF
         if total_entities > 0:
             try:
@@ -473,36 +598,38 @@ def smart_curve_preserving_svg_to_dxf(svg_path: str, output_path: str, target_si
                 
                 abs_output_path = os.path.abspath(output_path)
                 print(f"   💾 Saving to: {abs_output_path}")
-                doc.saveas(abs_output_path)
                 
-                if os.path.exists(abs_output_path):
-                    file_size = os.path.getsize(abs_output_path)
-                    print(f"   ✅ Success: {total_entities} entities ({file_size/1024:.1f}KB)")
-                    
-                    # Show entity breakdown
-                    print(f"   📊 Entity types:")
-                    for entity_type, count in entity_counts.items():
+                # Serialize in memory and write the encoded bytes in one go; the
+                # size comes from the buffer instead of a stat on the new file
+                buffer = io.StringIO()
+                doc.write(buffer)
+                data = buffer.getvalue().encode(doc.output_encoding, errors='dxfreplace')
+                with open(abs_output_path, 'wb') as f:
+                    f.write(data)
+                file_size = len(data)
+                print(f"   ✅ Success: {total_entities} entities ({file_size/1024:.1f}KB)")
+                
+                # Show entity breakdown
+                print(f"   📊 Entity types:")
+                for entity_type, count in entity_counts.items():
+                    if count > 0:
+                        print(f"      • {entity_type}: {count}")
+                
+                # Show smart filtering results
+                total_rejected = sum(curve_rejections.values())
+                if total_rejected > 0:
+                    print(f"   🧠 Smart filtering:")
+                    print(f"      • Rejected {total_rejected} unnecessary curves")
+                    for reason, count in curve_rejections.items():
                         if count > 0:
-                            print(f"      • {entity_type}: {count}")
-                    
-                    # Show smart filtering results
-                    total_rejected = sum(curve_rejections.values())
-                    if total_rejected > 0:
-                        print(f"   🧠 Smart filtering:")
-                        print(f"      • Rejected {total_rejected} unnecessary curves")
-                        for reason, count in curve_rejections.items():
-                            if count > 0:
-                                print(f"        - {reason}: {count}")
-                    
-                    # Calculate curve percentage
-                    curve_entities = entity_counts["splines"] + entity_counts["arcs"]
-                    curve_percentage = (curve_entities / total_entities * 100) if total_entities > 0 else 0
-                    print(f"   📈 Meaningful curves: {curve_percentage:.1f}% ({curve_entities}/{total_entities})")
-                    
-                    return True
-                else:
-                    print(f"   ❌ DXF file was not created")
-                    return False
+                            print(f"        - {reason}: {count}")
+                
+                # Calculate curve percentage
+                curve_entities = entity_counts["splines"] + entity_counts["arcs"]
+                curve_percentage = (curve_entities / total_entities * 100) if total_entities > 0 else 0
+                print(f"   📈 Meaningful curves: {curve_percentage:.1f}% ({curve_entities}/{total_entities})")
+                
+                return True
             except Exception as e:
                 print(f"   ❌ Failed to save DXF: {e}")
                 return False
@@ -524,8 +651,45 @@ def svg_to_dxf_smart_curves(svg_path: str, output_path: str, target_size_mm: flo
     return smart_curve_preserving_svg_to_dxf(svg_path, output_path, target_size_mm)
 
 # Main execution function for testing
+def process_one(png_file: str, output_dir: str) -> bool:
+    """Preprocess and trace a single PNG into output_dir (runs in a worker process)."""
+    # Capture this file's progress, including the helpers' prints, and write it in one
+    # call so output from parallel workers interleaves at file boundaries
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            return _process_one(png_file, output_dir)
+    finally:
+        sys.stdout.write(log.getvalue())
+
+def _process_one(png_file: str, output_dir: str) -> bool:
+    """Body of process_one, run with stdout captured."""
+    base_name = os.path.splitext(os.path.basename(png_file))[0]
+    print(f"\n=== Processing {os.path.basename(png_file)} ===")
+    
+    # Step 1: Preprocess PNG (kept in memory, no temporary PNG); workers run
+    # concurrently, so each input gets its own debug directory
+    print("🔧 Step 1: Preprocessing PNG...")
+    preprocessed = preprocess_png_image(png_file, processing_type="full_processing", debug=True,
+                                        debug_dir=os.path.join("debug_preprocessing", base_name))
+    if preprocessed is None:
+        print("❌ Preprocessing failed, skipping file")
+        return False
+    
+    # Step 2: Convert PNG to SVG (final output)
+    svg_file = os.path.join(output_dir, f"{base_name}.svg")
+    print("🔧 Step 2: Converting PNG to SVG...")
+    if ndarray_to_svg_potrace(preprocessed, svg_file):
+        print(f"✅ Successfully converted: {svg_file}")
+        return True
+    print("❌ PNG to SVG conversion failed")
+    return False
+
+
 if __name__ == "__main__":
     import glob
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
     
     # Test with PNG files from pngs directory
     pngs_dir = os.path.join(os.path.dirname(__file__), 'pngs')
@@ -542,32 +706,11 @@ if __name__ == "__main__":
     print(f"Found {len(png_files)} PNG files to process")
     print(f"Output directory: {output_dir}")
     
-    successful_conversions = 0
+    # Files are independent, so convert them in parallel across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(executor.map(partial(process_one, output_dir=output_dir), png_files))
     
-    for i, png_file in enumerate(png_files, 1):
-        print(f"\n=== Processing {i}/{len(png_files)}: {os.path.basename(png_file)} ===")
-        
-        base_name = os.path.splitext(os.path.basename(png_file))[0]
-        
-        # Step 1: Preprocess PNG
-        preprocessed_png = f"temp_{base_name}_preprocessed.png"
-        print("🔧 Step 1: Preprocessing PNG...")
-        if not preprocess_png_image(png_file, preprocessed_png, "full_processing"):
-            print("❌ Preprocessing failed, skipping file")
-            continue
-        
-        # Step 2: Convert PNG to SVG (final output)
-        svg_file = os.path.join(output_dir, f"{base_name}.svg")
-        print("🔧 Step 2: Converting PNG to SVG...")
-        if png_to_svg_potrace(preprocessed_png, svg_file):
-            print(f"✅ Successfully converted: {svg_file}")
-            successful_conversions += 1
-        else:
-            print("❌ PNG to SVG conversion failed")
-        
-        # Clean up temporary files
-        if os.path.exists(preprocessed_png):
-            os.remove(preprocessed_png)
+    successful_conversions = sum(results)
     
     # Summary
     print(f"\n=== CONVERSION SUMMARY ===")